@@ -0,0 +1,153 @@
+"""
+Numeric kernels for the pixelwise RTM inversion.
+
+The inversion is a nearest-neighbor search of every valid pixel
+spectrum against the LUT rows under RMSE. If numba is installed the
+search runs through a JIT-compiled, thread-parallel kernel; otherwise
+a blocked NumPy implementation is used.
+
+Copyright (C) 2024 Terensis
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+# numba is an optional dependency. If it is available, a JIT-compiled
+# kernel is used for the RMSE-based inversion which is considerably
+# faster than the interpreted fallback.
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    njit, prange = None, range
+    HAVE_NUMBA = False
+
+
+def topk_rmse(
+        pixels: np.ndarray,
+        lut: np.ndarray,
+        n_solutions: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the `n_solutions` LUT entries with the smallest RMSE for
+    each pixel spectrum. A bounded max-heap per pixel keeps the
+    selection cost at O(n_lut * log(n_solutions)).
+
+    :param pixels:
+        pixel spectra with shape (n_pixels, n_bands)
+    :param lut:
+        LUT spectra with shape (n_lut, n_bands)
+    :param n_solutions:
+        number of solutions to keep per pixel
+    :return:
+        tuple of LUT indices and cost function values, each with
+        shape (n_pixels, n_solutions)
+    """
+    n_pixels, n_bands = pixels.shape
+    n_lut = lut.shape[0]
+    out_idxs = np.zeros((n_pixels, n_solutions), dtype=np.int64)
+    out_costs = np.zeros((n_pixels, n_solutions), dtype=np.float32)
+    for i in prange(n_pixels):
+        heap_cost = np.full(n_solutions, np.inf, dtype=np.float32)
+        heap_idx = np.zeros(n_solutions, dtype=np.int64)
+        for j in range(n_lut):
+            acc = 0.
+            for b in range(n_bands):
+                diff = pixels[i, b] - lut[j, b]
+                acc += diff * diff
+            cost = np.sqrt(acc / n_bands)
+            if cost < heap_cost[0]:
+                # replace the current worst solution (heap root)
+                # and sift down to restore the heap property
+                heap_cost[0] = cost
+                heap_idx[0] = j
+                pos = 0
+                while True:
+                    left = 2 * pos + 1
+                    right = left + 1
+                    largest = pos
+                    if left < n_solutions and \
+                            heap_cost[left] > heap_cost[largest]:
+                        largest = left
+                    if right < n_solutions and \
+                            heap_cost[right] > heap_cost[largest]:
+                        largest = right
+                    if largest == pos:
+                        break
+                    heap_cost[pos], heap_cost[largest] = \
+                        heap_cost[largest], heap_cost[pos]
+                    heap_idx[pos], heap_idx[largest] = \
+                        heap_idx[largest], heap_idx[pos]
+                    pos = largest
+        out_idxs[i] = heap_idx
+        out_costs[i] = heap_cost
+    return out_idxs, out_costs
+
+
+if HAVE_NUMBA:
+    topk_rmse = njit(
+        parallel=True, fastmath=True, cache=True)(topk_rmse)
+
+
+def topk_rmse_numpy(
+        pixels: np.ndarray,
+        lut: np.ndarray,
+        n_solutions: int,
+        block_size: int = 4096
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized NumPy variant of `topk_rmse` used when numba is not
+    available. Pixels are processed in blocks so the temporary
+    (block_size, n_lut) distance matrix stays cache-friendly.
+
+    :param pixels:
+        pixel spectra with shape (n_pixels, n_bands)
+    :param lut:
+        LUT spectra with shape (n_lut, n_bands)
+    :param n_solutions:
+        number of solutions to keep per pixel
+    :param block_size:
+        number of pixels scored per block
+    :return:
+        tuple of LUT indices and cost function values, each with
+        shape (n_pixels, n_solutions)
+    """
+    n_pixels, n_bands = pixels.shape
+    n_lut = lut.shape[0]
+    out_idxs = np.zeros((n_pixels, n_solutions), dtype=np.int64)
+    out_costs = np.zeros((n_pixels, n_solutions), dtype=np.float32)
+    kth = min(n_solutions, n_lut - 1)
+    # the squared LUT norms are block-invariant; computing them once
+    # keeps the per-block work to a single BLAS matmul
+    lut_sq = (lut ** 2).sum(axis=1)
+    for start in range(0, n_pixels, block_size):
+        block = pixels[start:start + block_size]
+        # squared distances between every pixel of the block and
+        # every LUT entry -> (len(block), n_lut), expanded as
+        # ||x||^2 + ||l||^2 - 2 x.l so the cross term runs through
+        # BLAS SGEMM and the LUT stays hot in cache across blocks
+        dists = (block ** 2).sum(axis=1, keepdims=True) \
+            + lut_sq[np.newaxis, :] \
+            - 2. * block @ lut.T
+        # guard against tiny negative values from floating-point
+        # cancellation before the square root
+        np.maximum(dists, 0., out=dists)
+        # partial selection of the n_solutions smallest distances
+        idxs = np.argpartition(dists, kth, axis=1)[:, :n_solutions]
+        costs = np.sqrt(
+            np.take_along_axis(dists, idxs, axis=1) / n_bands)
+        out_idxs[start:start + block_size] = idxs
+        out_costs[start:start + block_size] = costs
+    return out_idxs, out_costs
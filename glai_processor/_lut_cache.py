@@ -0,0 +1,189 @@
+"""
+Content-addressed on-disk cache for PROSAIL lookup-tables (LUTs).
+
+Scenes acquired from the same relative orbit days apart have viewing
+and illumination angles that are nearly identical, and the LUT only
+depends on the acquisition geometry, the sensor, and the RTM
+parametrization. Caching the LUTs by a hash of these inputs therefore
+avoids re-running the expensive PROSAIL forward simulations for
+repeated orbits in a monitoring run.
+
+Copyright (C) 2024 Terensis
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import os
+import pandas as pd
+import urllib.request
+
+from pathlib import Path
+from rtm_inv.core.lookup_table import generate_lut
+
+
+# angular resolution in degrees used for cache lookups. PROSAIL
+# simulations are insensitive to angular differences below ~0.5 degree.
+ANGLE_RESOLUTION: float = 0.5
+
+
+def _localize_srf(cache_dir: Path, fpath_srf: str) -> str:
+    """
+    Download a remote spectral response function (SRF) into the
+    cache directory on first use and return the local path. The
+    SRF never changes for a given URL, so without this every LUT
+    build re-downloads the same XLSX file. Local paths are
+    returned unchanged.
+
+    :param cache_dir:
+        directory where the SRF is cached
+    :param fpath_srf:
+        path or URL to the spectral response function
+    :return:
+        path of the local SRF copy (or `fpath_srf` if it is local)
+    """
+    if not str(fpath_srf).startswith(('http://', 'https://')):
+        return fpath_srf
+    suffix = Path(str(fpath_srf).split('?')[0]).suffix
+    digest = hashlib.blake2b(
+        str(fpath_srf).encode(), digest_size=16).hexdigest()
+    fpath_local = cache_dir.joinpath(f'srf_{digest}{suffix}')
+    if not fpath_local.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # download to a per-process temporary name and rename
+        # atomically, so concurrent worker processes never read a
+        # partially written file
+        fpath_tmp = fpath_local.with_suffix(
+            f'{suffix}.{os.getpid()}.tmp')
+        urllib.request.urlretrieve(str(fpath_srf), fpath_tmp)
+        os.replace(fpath_tmp, fpath_local)
+    return str(fpath_local)
+
+
+def lut_cache_key(
+        sensor: str,
+        lut_params: pd.DataFrame,
+        angles: dict[str, float],
+        lut_size: int,
+        sampling_method: str,
+        fpath_srf: str
+) -> str:
+    """
+    Compute the cache key for a LUT from all inputs the LUT
+    depends on. Angles are rounded to `ANGLE_RESOLUTION` so scenes
+    with near-identical acquisition geometry share a cache entry.
+
+    :param sensor:
+        name of the sensor (e.g., 'Sentinel2A')
+    :param lut_params:
+        RTM parametrization as DataFrame
+    :param angles:
+        viewing and illumination angles of the scene
+    :param lut_size:
+        size of the lookup table
+    :param sampling_method:
+        statistical sampling method for generating the LUT
+    :param fpath_srf:
+        path (or URL) to the spectral response function
+    :return:
+        hexadecimal cache key
+    """
+    rounded_angles = {
+        k: round(v / ANGLE_RESOLUTION) * ANGLE_RESOLUTION
+        for k, v in sorted(angles.items())}
+    key_parts = repr((
+        sensor, rounded_angles, lut_size, sampling_method, str(fpath_srf)))
+    lut_params_bytes = lut_params.to_csv(index=False).encode()
+    return hashlib.blake2b(
+        key_parts.encode() + lut_params_bytes, digest_size=16).hexdigest()
+
+
+def cached_generate_lut(
+        cache_dir: Path,
+        sensor: str,
+        lut_params: pd.DataFrame,
+        angles: dict[str, float],
+        lut_size: int,
+        sampling_method: str,
+        fpath_srf: str,
+        use_cache: bool = True
+) -> pd.DataFrame:
+    """
+    Generate a PROSAIL LUT, reusing a cached LUT if a scene with
+    (nearly) the same acquisition geometry was generated before.
+
+    :param cache_dir:
+        directory where cached LUTs are stored
+    :param sensor:
+        name of the sensor (e.g., 'Sentinel2A')
+    :param lut_params:
+        RTM parametrization as DataFrame
+    :param angles:
+        viewing and illumination angles of the scene
+    :param lut_size:
+        size of the lookup table
+    :param sampling_method:
+        statistical sampling method for generating the LUT
+    :param fpath_srf:
+        path (or URL) to the spectral response function
+    :param use_cache:
+        whether to look up (and populate) the on-disk cache.
+    :return:
+        LUT with simulated spectra
+    """
+    if use_cache:
+        key = lut_cache_key(
+            sensor=sensor,
+            lut_params=lut_params,
+            angles=angles,
+            lut_size=lut_size,
+            sampling_method=sampling_method,
+            fpath_srf=fpath_srf)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fpath_cache = cache_dir.joinpath(f'{key}.parquet')
+        if fpath_cache.exists():
+            return pd.read_parquet(fpath_cache, engine='pyarrow')
+
+    # cache miss (or caching disabled) -> run the forward simulations.
+    # A remote SRF is downloaded into the cache directory once; the
+    # cache key above is computed from the original URL so cached
+    # LUTs stay valid across runs.
+    fpath_srf = _localize_srf(cache_dir=cache_dir, fpath_srf=fpath_srf)
+    lut_srf = generate_lut(
+        sensor=sensor,
+        lut_params=lut_params,
+        solar_zenith_angle=angles['solar_zenith_angle'],
+        viewing_zenith_angle=angles['viewing_zenith_angle'],
+        solar_azimuth_angle=angles['solar_azimuth_angle'],
+        viewing_azimuth_angle=angles['viewing_azimuth_angle'],
+        lut_size=lut_size,
+        sampling_method=sampling_method,
+        fpath_srf=fpath_srf,
+        remove_invalid_green_peaks=True,
+        linearize_lai=False
+    )
+    if use_cache:
+        # write to a per-process temporary name and rename atomically.
+        # Same-orbit scenes processed concurrently share a cache key,
+        # so without the rename one worker could read (or interleave
+        # writes with) a half-written cache file.
+        fpath_tmp = fpath_cache.with_suffix(
+            f'.parquet.{os.getpid()}.tmp')
+        lut_srf.to_parquet(
+            fpath_tmp,
+            engine='pyarrow',
+            compression='zstd',
+            compression_level=1)
+        os.replace(fpath_tmp, fpath_cache)
+    return lut_srf
@@ -0,0 +1,433 @@
+"""
+Pipeline orchestration of the GLAI processor: fetching satellite
+data, generating the lookup-tables and running the inversion. It is
+based on the eodal package and uses the rtm_inv package for the
+inversion of the RTM. The public entry points are re-exported lazily
+by the package `__init__`.
+
+Copyright (C) 2023 Lukas Valentin Graf (lukas.graf@terensis.io)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import pandas as pd
+import warnings
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from eodal.config import get_settings
+from eodal.mapper.feature import Feature
+from eodal.mapper.mapper import MapperConfigs
+from pathlib import Path
+from typing import Any
+
+from glai_processor._lut_cache import cached_generate_lut
+from glai_processor.constants import Constants, Sentinel2Constants
+from glai_processor.fetch_satellite_data import fetch_data
+from glai_processor.inversion import invert
+from glai_processor.utils import (
+    get_latest_scene,
+    indicate_complete,
+    load_angles,
+    platform_from_filename,
+    set_latest_scene
+)
+
+
+# setup logging and usage of STAC API for data access
+settings = get_settings()
+settings.USE_STAC = True
+logger = settings.logger
+
+# ignore COG creation warnings
+warnings.filterwarnings("ignore")
+
+
+@lru_cache(maxsize=4)
+def _read_rtm_params(rtm_params: str) -> pd.DataFrame:
+    """
+    Read the RTM parametrization, memoized by path/URL. The CLI
+    default is a raw github URL, so without the cache every
+    `run_rtm` call of a monitoring run would re-download the same
+    small CSV.
+
+    :param rtm_params:
+        path or URL of the RTM parametrization CSV
+    :return:
+        RTM parametrization as DataFrame
+    """
+    return pd.read_csv(rtm_params)
+
+
+def get_data(
+    output_dir: Path,
+    constants: Constants,
+    feature: Feature,
+    time_start: datetime,
+    time_end: datetime
+) -> None:
+    """
+    Get the satellite data for a given time period and geographic extent
+    to enable GLAI retrieval.
+
+    :param output_dir: output directory where to store the data
+    :param constants: Constants object containing the scene kwargs
+    :param feature: geographic feature (area) for which to get satellite data
+    :time_start: start datetime for extracting satellite data
+    :time_end: end datetime for extracting satellite data
+    """
+    # define the mapper configs
+    mapper_configs = MapperConfigs(
+        collection=constants.COLLECTION,
+        time_start=time_start,
+        time_end=time_end,
+        feature=feature,
+        metadata_filters=constants.METADATA_FILTERS)
+
+    # fetch the data
+    fetch_data(
+        mapper_configs=mapper_configs,
+        scene_kwargs=constants.SCENE_KWARGS,
+        band_selection=constants.SCENE_KWARGS['scene_constructor_kwargs']['band_selection'],  # noqa E501
+        output_dir=output_dir
+    )
+
+
+def _process_scene(
+    yaml_file: Path,
+    output_dir: Path,
+    constants: Constants,
+    lut_params: pd.DataFrame,
+    traits: list[str],
+    sampling_method: str,
+    lut_size: int,
+    n_solutions: int,
+    cost_function: str,
+    use_lut_cache: bool,
+    use_numba: bool
+) -> None:
+    """
+    Process a single scene, i.e., generate the scene-specific
+    lookup table (LUT) if not available yet and invert the scene
+    pixel by pixel.
+
+    This function is module-level so it can be dispatched to worker
+    processes. `constants` must be the Constants class object (not an
+    instance) to keep it picklable.
+
+    :param yaml_file:
+        YAML file with the scene viewing and illumination angles
+    :param output_dir:
+        directory with satellite data (GeoTiff files)
+    :param constants:
+        Constants object containing the scene kwargs
+    :param lut_params:
+        RTM parametrization as DataFrame
+    :param traits:
+        list of traits to retrieve
+    :param sampling_method:
+        statistical sampling method for generating the LUT
+    :param lut_size:
+        size of the lookup table
+    :param n_solutions:
+        number of solutions to use for the inversion
+    :param cost_function:
+        cost function to use for the inversion
+    :param use_lut_cache:
+        whether to reuse LUTs cached for scenes with (nearly) the
+        same acquisition geometry
+    :param use_numba:
+        use the JIT-compiled inversion kernel if numba is available
+    """
+    fname_lut = yaml_file.name.replace(
+        'angles.yaml', 'lut.parquet'
+    )
+    fpath_lut = output_dir.joinpath(fname_lut)
+
+    # GeoTiff file containing the spectral values
+    band_names_file = '-'.join(
+        constants.SCENE_KWARGS[
+            'scene_constructor_kwargs']['band_selection']
+    ) + '.tiff'
+    fname_sat_data = yaml_file.name.replace(
+        'angles.yaml', band_names_file)
+    fpath_sat_data = output_dir.joinpath(fname_sat_data)
+
+    # if the LUT exists, do not overwrite
+    if not fpath_lut.exists():
+        # load the angles
+        angles = load_angles(yaml_file)
+        # get the platform from the file name
+        platform = platform_from_filename(fpath_sat_data.name)
+
+        # generate the lookup-tables using the methodology from
+        # Graf et al. (2023, RSE,
+        # https://doi.org/10.1016/j.rse.2023.113860).
+        # LUTs are cached by acquisition geometry, so repeated
+        # orbits in a monitoring run reuse earlier simulations.
+        lut_srf = cached_generate_lut(
+            cache_dir=output_dir.joinpath('.lut_cache'),
+            sensor=platform,
+            lut_params=lut_params,
+            angles=angles,
+            lut_size=lut_size,
+            sampling_method=sampling_method,
+            fpath_srf=constants.FPATH_SRF,
+            use_cache=use_lut_cache
+        )
+        # drop LUT rows with missing reflectance values. Only the
+        # simulated reflectance columns can come back NaN (invalid
+        # green peaks), so the null scan is restricted to them
+        # instead of walking every parameter column as well
+        refl_cols = [c for c in lut_srf.columns if c.startswith('B')]
+        if refl_cols:
+            lut_srf = lut_srf.loc[
+                lut_srf[refl_cols].notna().all(axis=1)]
+        else:
+            lut_srf = lut_srf.dropna()
+        lut_srf.to_parquet(
+            fpath_lut,
+            engine='pyarrow',
+            compression='zstd',
+            compression_level=1)
+
+    # invert the RTM to generate trait maps
+    fpath_output = output_dir / fpath_sat_data.name.replace(
+        '.tiff', '_traits.tiff')
+    if not fpath_output.exists():
+        invert(
+            fpath_lut=fpath_lut,
+            fpath_srf=fpath_sat_data,
+            output_dir=output_dir,
+            band_selection_lut=constants.BANDSELECTION_LUT,
+            band_selection_srf=constants.SCENE_KWARGS['scene_constructor_kwargs']['band_selection'],  # noqa E501
+            traits=traits,
+            n_solutions=n_solutions,
+            cost_function=cost_function,
+            use_numba=use_numba
+        )
+
+
+def run_rtm(
+    output_dir: Path,
+    constants: Constants,
+    rtm_params: Path,
+    traits: list[str],
+    sampling_method: str = 'frs',
+    lut_size: int = 50000,
+    n_solutions: int = 5000,
+    cost_function: str = 'rmse',
+    use_lut_cache: bool = True,
+    use_numba: bool = True
+) -> None:
+    """
+    Run the RTM in forward mode (if required) to generate scene-specific
+    lookup tables (LUTs) and peform the image inversion pixel by pixel.
+
+    :param output_dir:
+        directory with satellite data (GeoTiff files)
+    :param constants:
+        Constants object containing the scene kwargs
+    :param rtm_params:
+        RTM parametrization file
+    :param traits:
+        list of traits to retrieve
+    :param sampling_method:
+        statistical sampling method for generating the LUT
+    :param lut_size:
+        size of the lookup table
+    :param n_solutions:
+        number of solutions (matching spectral pairs with smallest cost
+        function values) to aggregate into a single solution using the
+        median.
+    :param cost_function:
+        cost function to use for the inversion.
+    :param use_lut_cache:
+        whether to reuse LUTs cached for scenes with (nearly) the
+        same acquisition geometry. Default: True.
+    :param use_numba:
+        use the JIT-compiled inversion kernel if numba is available.
+        Default: True.
+    """
+    # collect all angle files. Each of them denotes a single scene
+    # that can be processed independently of the others.
+    # Scenes whose trait map already exists are filtered out here
+    # once, so repeated monitor_folder iterations do not re-check
+    # (and re-stat) every historical scene in the worker processes.
+    band_names_file = '-'.join(
+        constants.SCENE_KWARGS[
+            'scene_constructor_kwargs']['band_selection']
+    ) + '.tiff'
+    # a single os.scandir pass provides both the angle files and the
+    # existing trait maps; existence checks then become set lookups
+    # instead of one stat syscall per file
+    with os.scandir(output_dir) as entries:
+        file_names = {e.name for e in entries if e.is_file()}
+    existing_traits = {
+        n for n in file_names
+        if n.startswith('S2') and n.endswith('_traits.tiff')}
+    yaml_files = [
+        output_dir.joinpath(n) for n in sorted(file_names)
+        if n.startswith('S2') and n.endswith('_angles.yaml')
+        and n.replace(
+            'angles.yaml', band_names_file
+        ).replace('.tiff', '_traits.tiff') not in existing_traits
+    ]
+    if not yaml_files:
+        return
+
+    # read the RTM parametrization once. It is invariant across
+    # scenes and might require a network fetch when a URL is given
+    # (e.g., the CLI default), so re-reading it per scene would
+    # waste both CPU and network round-trips. The loader memoizes
+    # by path, so subsequent monitoring windows reuse the download;
+    # the copy keeps the cached frame safe from mutation downstream.
+    try:
+        lut_params = _read_rtm_params(str(rtm_params)).copy()
+    except Exception as e:
+        raise ValueError(
+            f'Could not read RTM parameters from {rtm_params}: {e}')
+
+    # process the scenes in parallel. LUT generation and inversion
+    # are CPU-bound, hence processes are used instead of threads.
+    process_scene = partial(
+        _process_scene,
+        output_dir=output_dir,
+        constants=constants,
+        lut_params=lut_params,
+        traits=traits,
+        sampling_method=sampling_method,
+        lut_size=lut_size,
+        n_solutions=n_solutions,
+        cost_function=cost_function,
+        use_lut_cache=use_lut_cache,
+        use_numba=use_numba
+    )
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # list() consumes the iterator so that exceptions raised in
+        # the worker processes are re-raised here
+        list(executor.map(process_scene, yaml_files))
+
+
+def monitor_folder(
+    folder_to_monitor: Path,
+    feature: Feature,
+    inversion_kwargs: dict[str, Any],
+    time_start: datetime,
+    time_end: datetime,
+    constants: Constants = Sentinel2Constants,
+    temporal_increment_days: int = 7,
+) -> None:
+    """
+    Monitor a folder with satellite scenes and fetch new data
+    automatically. This function is intended to be run as a
+    cron job or similar on a regular basis. The function looks
+    for the last processed scene and fetches all scenes that
+    are newer than the last processed scene with a given temporal
+    increment.
+
+    The function can handle Sentinel-2 and Landsat.
+
+    :param folder_to_monitor:
+        folder to monitor with satellite scenes.
+    :param feature:
+        Feature object of the area of interest.
+    :param inversion_kwargs:
+        keyword arguments for `run_rtm`
+    :param time_start:
+        start of the time period to consider
+    :param time_end:
+        end of the time period to consider
+    :param constants:
+        Constants object define how to fetch the data (platform,
+        scene preprocessing, etc.).
+    :param temporal_increment_days:
+        temporal increment in days, i.e., the function will search
+        for scenes that are newer than the last processed scene
+        plus this increment.
+    """
+    # loop over the time period in increments of
+    # `temporal_increment_days` until the end date is reached.
+    # A while loop is used (instead of recursion) so the stack
+    # depth stays constant no matter how long the monitoring
+    # period is.
+    any_window_processed = False
+    while True:
+        # one wall-clock snapshot per iteration; reused for the
+        # future check and the latest-scene clamp below
+        now = datetime.now()
+
+        # get the latest scene to determine the start date
+        last_processed_scene = get_latest_scene(
+            output_dir=folder_to_monitor,
+            start_time=time_start
+        )
+        time_start_internal = last_processed_scene + timedelta(days=1)
+
+        # if time start is in the future, there is nothing to do
+        if time_start_internal > now:
+            logger.info(
+                "Start date %s is in the future. Exiting.",
+                time_start.date())
+            break
+        elif time_start_internal > time_end:
+            logger.info(
+                'Start date %s is beyond end date. Exiting.',
+                time_start_internal.date())
+            break
+
+        # the end time for the next query will be the time stamp of the
+        # last processed scene plus the temporal increment
+        time_end_internal = time_start_internal + timedelta(
+            days=temporal_increment_days)
+        # make sure the internal end date is no later than the end data
+        # given
+        if time_end_internal > time_end:
+            time_end_internal = time_end
+
+        # get data
+        try:
+            get_data(
+                output_dir=folder_to_monitor,
+                constants=constants,
+                time_start=time_start_internal,
+                time_end=time_end_internal,
+                feature=feature
+            )
+        except Exception as e:
+            logger.error("Error while fetching data: %s", e)
+            raise ValueError(f"Error while fetching data: {e}")
+
+        # perform inversion (generate lookup-tables and run the inversion)
+        try:
+            run_rtm(
+                output_dir=folder_to_monitor,
+                constants=constants,
+                **inversion_kwargs
+            )
+        except Exception as e:
+            logger.error("Error while running RTM: %s", e)
+            raise ValueError(f"Error while running RTM: {e}")
+
+        # update the "latest scene" timestamp
+        set_latest_scene(
+            folder_to_monitor, timestamp=time_end_internal, now=now)
+        any_window_processed = True
+
+    # as before the rewrite to a loop, completion is only indicated
+    # if at least one time window was actually processed
+    if any_window_processed:
+        indicate_complete(output_dir_scene=folder_to_monitor)
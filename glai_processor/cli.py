@@ -3,14 +3,17 @@ Command line interface for the GLAIProcessor.
 """
 
 import argparse
-import geopandas as gpd
 
 from datetime import datetime
-from eodal.mapper.feature import Feature
 from pathlib import Path
 
-from glai_processor.constants import *  # noqa
-from glai_processor import monitor_folder
+# heavy imports (geopandas, eodal, and the processing pipeline) are
+# deferred into main() so that `--help` and argparse errors respond
+# immediately instead of paying a multi-second cold import.
+
+# names of the supported platforms. The mapping to the Constants
+# classes is built in main() after the deferred imports.
+PLATFORM_CHOICES = ('Sentinel2', 'LandsatC2L1', 'LandsatC2L2')
 
 
 def get_parser() -> argparse.ArgumentParser:
@@ -72,7 +75,7 @@ def get_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         '--traits',
-        type=list[str],
+        nargs='+',
         help='List of traits to retrieve.',
         choices=[
             'n', 'lai', 'cab', 'car', 'cbrown',
@@ -85,8 +88,14 @@ def get_parser() -> argparse.ArgumentParser:
         '--platform',
         type=str,
         help='Satellite platform.',
+        choices=list(PLATFORM_CHOICES),
         default='Sentinel2'
     )
+    parser.add_argument(
+        '--no_lut_cache',
+        action='store_true',
+        help='Disable reuse of LUTs cached by acquisition geometry.'
+    )
     parser.add_argument(
         '--temporal_increment',
         type=int,
@@ -105,6 +114,26 @@ def main() -> None:
     parser = get_parser()
     args = parser.parse_args()
 
+    # deferred imports (see note at module top)
+    import geopandas as gpd
+
+    from eodal.mapper.feature import Feature
+
+    from glai_processor.constants import (
+        LandsatC2L1Constants,
+        LandsatC2L2Constants,
+        Sentinel2Constants
+    )
+    from glai_processor import monitor_folder
+
+    # mapping of platform names to the Constants classes defining
+    # how to fetch and preprocess the data
+    platform_constants = {
+        'Sentinel2': Sentinel2Constants,
+        'LandsatC2L1': LandsatC2L1Constants,
+        'LandsatC2L2': LandsatC2L2Constants
+    }
+
     # convert the arguments
     output_dir = Path(args.output_dir)
     if not output_dir.exists():
@@ -115,13 +144,18 @@ def main() -> None:
     )
     time_start = datetime.strptime(args.time_start, '%Y-%m-%d')
     time_end = datetime.strptime(args.time_end, '%Y-%m-%d')
+    # fail fast on an invalid time range before any data is fetched
+    if time_start >= time_end:
+        parser.error(
+            f'--time_start ({args.time_start}) must be before '
+            f'--time_end ({args.time_end})')
     rtm_params = args.rtm_params
     lut_size = args.lut_size
     n_solutions = args.n_solutions
     sampling_method = args.sampling_method
     traits = args.traits
     platform = args.platform
-    constants = eval(f'{platform}Constants')
+    constants = platform_constants[platform]
     temporal_increment = args.temporal_increment
 
     # run the GLAIProcessor
@@ -133,7 +167,8 @@ def main() -> None:
             'lut_size': lut_size,
             'n_solutions': n_solutions,
             'sampling_method': sampling_method,
-            'traits': traits
+            'traits': traits,
+            'use_lut_cache': not args.no_lut_cache
         },
         time_start=time_start,
         time_end=time_end,
@@ -20,10 +20,35 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import annotations
 
+from importlib.resources import files
+
 from eodal.core.sensors import Landsat, Sentinel2
 from eodal.mapper.filter import Filter
 
 
+def _packaged_or_remote(filename: str, url: str) -> str:
+    """
+    Resolve an auxiliary data file. If a copy is vendored under
+    `glai_processor/data` it is used directly, which avoids a
+    network fetch per LUT build; otherwise the remote URL is
+    returned as fallback.
+
+    :param filename:
+        name of the auxiliary file
+    :param url:
+        remote URL used when no vendored copy exists
+    :return:
+        local path of the vendored copy or the URL
+    """
+    try:
+        candidate = files('glai_processor').joinpath('data', filename)
+        if candidate.is_file():
+            return str(candidate)
+    except (ModuleNotFoundError, OSError):
+        pass
+    return url
+
+
 def preprocess_landsat_scene(
         ds: Landsat
 ) -> Landsat:
@@ -146,4 +171,7 @@ class Sentinel2Constants(Constants):
     BANDSELECTION_LUT = ['B02', 'B03', 'B04', 'B08']
 
     # spectral response function
-    FPATH_SRF = 'https://raw.githubusercontent.com/EOA-team/sentinel2_crop_trait_timeseries/main/data/auxiliary/S2-SRF_COPE-GSEG-EOPG-TN-15-0007_3.1.xlsx'  # noqa E501
+    FPATH_SRF = _packaged_or_remote(
+        'S2-SRF_COPE-GSEG-EOPG-TN-15-0007_3.1.xlsx',
+        'https://raw.githubusercontent.com/EOA-team/sentinel2_crop_trait_timeseries/main/data/auxiliary/S2-SRF_COPE-GSEG-EOPG-TN-15-0007_3.1.xlsx'  # noqa E501
+    )
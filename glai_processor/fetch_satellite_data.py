@@ -19,34 +19,132 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+import pandas as pd
 import planetary_computer
 import tempfile
-import uuid
+import urllib3
 import urllib.request
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
+from xml.etree import ElementTree
+
 from eodal.mapper.mapper import Mapper, MapperConfigs
 from eodal.metadata.sentinel2.parsing import parse_MTD_TL
 
+from glai_processor.utils import validate_cog
+
+# prefer the libyaml-backed dumper; it is roughly an order of
+# magnitude faster than the pure-Python fallback
+try:
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
+
+# let GDAL use all cores for COG compression and overview building
+# unless the user configured it explicitly
+os.environ.setdefault('GDAL_NUM_THREADS', 'ALL_CPUS')
+
+# module-level connection pool so the many small metadata requests
+# reuse TCP/TLS connections to the Planetary Computer blob host
+# instead of paying a full handshake per scene. All worker threads
+# share the pool.
+_HTTP = urllib3.PoolManager(
+    maxsize=16,
+    retries=urllib3.Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 502, 503]
+    )
+)
+
+
+def _angles_from_xml(xml_bytes: bytes) -> dict[str, float]:
+    """
+    Extract the sensor zenith and azimuth angle from the metadata
+    XML with a streaming in-memory parse. The MTD_TL file reports
+    one mean viewing incidence angle pair per band; like eodal's
+    `parse_MTD_TL`, the band-wise values are averaged into a single
+    scene-wide angle. Returns an incomplete dictionary if the
+    expected elements are missing (the caller then falls back to
+    `parse_MTD_TL`).
 
+    :param xml_bytes:
+        raw bytes of the metadata XML file
+    :returns:
+        extracted angles as dictionary (possibly incomplete)
+    """
+    zenith_angles, azimuth_angles = [], []
+    in_viewing_angles = False
+    for event, element in ElementTree.iterparse(
+            BytesIO(xml_bytes), events=('start', 'end')):
+        # strip a possible namespace from the tag
+        tag = element.tag.rpartition('}')[-1]
+        if event == 'start':
+            if tag == 'Mean_Viewing_Incidence_Angle_List':
+                in_viewing_angles = True
+            continue
+        if tag == 'Mean_Viewing_Incidence_Angle_List':
+            # all band-wise viewing angles seen; the rest of the
+            # document holds no further angle information
+            break
+        if in_viewing_angles:
+            # ZENITH_ANGLE/AZIMUTH_ANGLE also occur under
+            # Mean_Sun_Angle, hence the list-scope flag
+            if tag == 'ZENITH_ANGLE' and element.text is not None:
+                zenith_angles.append(float(element.text))
+            elif tag == 'AZIMUTH_ANGLE' and element.text is not None:
+                azimuth_angles.append(float(element.text))
+        else:
+            element.clear()
+    angles = {}
+    if zenith_angles:
+        angles['SENSOR_ZENITH_ANGLE'] = \
+            sum(zenith_angles) / len(zenith_angles)
+    if azimuth_angles:
+        angles['SENSOR_AZIMUTH_ANGLE'] = \
+            sum(azimuth_angles) / len(azimuth_angles)
+    return angles
+
+
+@lru_cache(maxsize=1024)
 def angles_from_mspc(url: str) -> dict[str, float]:
     """
     Extract viewing and illumination angles from MS Planetary Computer
     metadata XML (this is a work-around until STAC provides the angles
     directly)
 
+    The result is cached by URL since the same granule metadata might
+    be requested repeatedly when `monitor_folder` queries adjacent
+    time windows.
+
     :param url:
         URL to the metadata XML file
     :returns:
         extracted angles as dictionary
     """
-    response = urllib.request.urlopen(planetary_computer.sign_url(url)).read()
-    temp_file = os.path.join(tempfile.gettempdir(), f'{uuid.uuid4()}.xml')
-    with open(temp_file, 'wb') as dst:
-        dst.write(response)
+    response = _HTTP.request('GET', planetary_computer.sign_url(url)).data
+
+    # fast path: stream-parse the XML in memory. This avoids the
+    # temp-file round-trip and building a full document tree just
+    # to read two values.
+    try:
+        sensor_angle_dict = _angles_from_xml(response)
+    except ElementTree.ParseError:
+        sensor_angle_dict = {}
+    if len(sensor_angle_dict) == 2:
+        return sensor_angle_dict
 
-    metadata = parse_MTD_TL(in_file=temp_file)
+    # fallback: let eodal parse the full metadata file. parse_MTD_TL
+    # requires a file on disk; NamedTemporaryFile cleans it up
+    # automatically so no orphaned XML files accumulate.
+    with tempfile.NamedTemporaryFile(suffix='.xml') as temp_file:
+        temp_file.write(response)
+        temp_file.flush()
+        metadata = parse_MTD_TL(in_file=temp_file.name)
     # get sensor zenith and azimuth angle
     sensor_angles = ['SENSOR_ZENITH_ANGLE', 'SENSOR_AZIMUTH_ANGLE']
     sensor_angle_dict = {
@@ -54,11 +152,97 @@ def angles_from_mspc(url: str) -> dict[str, float]:
     return sensor_angle_dict
 
 
+def _prefetch_cog_headers(asset_records, max_workers: int = 16) -> None:
+    """
+    Best-effort warm-up of the object-storage/CDN cache by fetching
+    the first MB of each raster asset concurrently before eodal loads
+    the scenes. The responses are discarded; failures are ignored
+    since prefetching is purely opportunistic.
+
+    :param asset_records:
+        iterable of STAC asset dictionaries (one per scene)
+    :param max_workers:
+        number of concurrent requests
+    """
+    urls = []
+    for assets in asset_records:
+        for asset in assets.values():
+            href = asset.get('href', '')
+            if href.lower().split('?')[0].endswith(
+                    ('.tif', '.tiff', '.jp2')):
+                urls.append(href)
+    if not urls:
+        return
+
+    def _fetch(url: str) -> None:
+        try:
+            request = urllib.request.Request(
+                planetary_computer.sign_url(url),
+                headers={'Range': 'bytes=0-1048575'})
+            urllib.request.urlopen(request, timeout=30).read()
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(_fetch, urls))
+
+
+def _write_scene(
+        timestamp,
+        scene,
+        meta_by_ts: dict,
+        angle_columns: list[str],
+        band_selection: list[str],
+        band_str: str,
+        output_dir: Path
+) -> None:
+    """
+    Write a single scene as cloud-optimized GeoTiff together with
+    its angle YAML file.
+
+    :param timestamp:
+        sensing timestamp of the scene
+    :param scene:
+        eodal scene object
+    :param meta_by_ts:
+        scene metadata grouped by rounded sensing time
+    :param angle_columns:
+        names of the angle columns to dump to YAML
+    :param band_selection:
+        name of the spectral bands to save
+    :param band_str:
+        band names joined for the output file name
+    :param output_dir:
+        output directory to save data to
+    """
+    platform = scene.scene_properties.platform
+    fpath_scene = \
+        output_dir / f'{platform}_{timestamp.date()}_{band_str}.tiff'
+    scene.to_rasterio(
+        fpath_scene,
+        band_selection=band_selection,
+        as_cog=True)
+    # warn early if the written file has a broken COG layout
+    validate_cog(fpath_scene)
+    # save the relevant metadata as yaml. Metadata is selected by
+    # timestamp rounded to seconds; the group is only read, so no
+    # defensive copy is needed.
+    fpath_metadata = output_dir.joinpath(
+        f'{platform}_{timestamp.date()}_angles.yaml')
+    metadata = meta_by_ts[pd.Timestamp(timestamp).round('S')]
+    angle_dict = metadata[angle_columns].iloc[0].to_dict()
+    with open(fpath_metadata, 'w') as dst:
+        yaml.dump(
+            angle_dict, dst, Dumper=_YamlDumper,
+            default_flow_style=False)
+
+
 def fetch_data(
         mapper_configs: MapperConfigs,
         output_dir: Path,
         scene_kwargs: dict = None,
-        band_selection: list[str] = ['red', 'green', 'blue', 'nir_1']
+        band_selection: list[str] = ['red', 'green', 'blue', 'nir_1'],
+        parallel_prefetch: bool = True
 ) -> None:
     """
     Fetch satellite data from STAC API. Each scene is stored
@@ -75,6 +259,9 @@ def fetch_data(
         kwargs for reading the scene into EOdal
     :band_selection:
         name of the spectral bands to fetch
+    :parallel_prefetch:
+        warm up the remote cache by requesting the first MB of each
+        raster asset concurrently before the scenes are loaded
     """
     # query the scenes available (no I/O of scenes, this only fetches metadata)
     mapper = Mapper(mapper_configs)
@@ -88,47 +275,67 @@ def fetch_data(
     # available in the STAC metadata, so we need to fetch it from
     # the original metadata.
     if mapper_configs.collection == 'sentinel2-msi':
-        mapper.metadata['href_xml'] = mapper.metadata.assets.apply(
-            lambda x: x['granule-metadata']['href']
-        )
-        mapper.metadata['sensor_angles'] = mapper.metadata['href_xml'].apply(
-            lambda x, angles_from_mspc=angles_from_mspc: angles_from_mspc(x)
-        )
-        mapper.metadata['sensor_zenith_angle'] = \
-            mapper.metadata['sensor_angles'].apply(
-                lambda x: x['SENSOR_ZENITH_ANGLE'])
-        mapper.metadata['sensor_azimuth_angle'] = \
-            mapper.metadata['sensor_angles'].apply(
-                lambda x: x['SENSOR_AZIMUTH_ANGLE'])
+        mapper.metadata['href_xml'] = [
+            x['granule-metadata']['href'] for x in mapper.metadata.assets]
+        # fetch the angles concurrently. The fetches are independent
+        # HTTPS requests (I/O-bound), so threads overlap the network
+        # latency across scenes.
+        urls = mapper.metadata['href_xml'].tolist()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            angle_dicts = list(executor.map(angles_from_mspc, urls))
+        mapper.metadata['sensor_angles'] = angle_dicts
+        # unpack the two scalar angle columns with a single join
+        angles_df = pd.DataFrame(
+            angle_dicts, index=mapper.metadata.index
+        ).rename(columns={
+            'SENSOR_ZENITH_ANGLE': 'sensor_zenith_angle',
+            'SENSOR_AZIMUTH_ANGLE': 'sensor_azimuth_angle'})
+        mapper.metadata = mapper.metadata.join(angles_df)
     # TODO: add Landsat angles
 
+    # warm up the remote cache so load_scenes finds the data "hot"
+    if parallel_prefetch:
+        _prefetch_cog_headers(mapper.metadata.assets)
+
     # load the scenes available from STAC
     mapper.load_scenes(scene_kwargs=scene_kwargs)
 
     # save scenes as cloud-optimized GeoTiff
     band_str = '-'.join(band_selection)
-    for timestamp, scene in mapper.data:
-        platform = scene.scene_properties.platform
-        scene.to_rasterio(
-            output_dir / f'{platform}_{timestamp.date()}_{band_str}.tiff',
-            band_selection=band_selection,
-            as_cog=True)
-        # save the relevant metadata as yaml
-        fpath_metadata = output_dir.joinpath(
-            f'{platform}_{timestamp.date()}_angles.yaml')
-        # select metadata by timestamp rounded to seconds
-        metadata = mapper.metadata[
-            mapper.metadata.sensing_time.dt.round('S').dt.strftime(
-                '%Y-%m-%d %H:%M:%S') ==
-            timestamp.strftime('%Y-%m-%d %H:%M:%S')].copy()
-        # select only the angles
-        angle_columns = [
-            x for x in metadata.columns if 'angle' in x
-            and x != 'sensor_angles']
-        # save the metadata as yaml
-        angle_dict = metadata[angle_columns].to_dict('records')[0]
-        with open(fpath_metadata, 'w') as dst:
-            yaml.dump(angle_dict, dst)
+    # pre-compute the rounded sensing-time key once. Re-deriving it
+    # over the full metadata frame inside the loop would make the
+    # per-scene lookup O(N) and the whole loop O(N^2). Timestamps
+    # are compared directly, avoiding strftime string allocations.
+    mapper.metadata['_ts_key'] = \
+        mapper.metadata.sensing_time.dt.round('S')
+    meta_by_ts = {
+        k: v for k, v in mapper.metadata.groupby('_ts_key', sort=False)}
+    # the set of angle columns is loop-invariant
+    angle_columns = [
+        x for x in mapper.metadata.columns if 'angle' in x
+        and x != 'sensor_angles']
+    # COG creation (compression, tiling, overviews) is the expensive
+    # part and rasterio releases the GIL during I/O, so whole scenes
+    # are written concurrently by a small thread pool. GDAL already
+    # parallelizes each write internally (GDAL_NUM_THREADS), hence
+    # the modest pool size.
+    scenes = list(mapper.data)
+    write_futures = []
+    with ThreadPoolExecutor(
+            max_workers=min(4, max(1, len(scenes)))) as writer:
+        for timestamp, scene in scenes:
+            write_futures.append(writer.submit(
+                _write_scene,
+                timestamp=timestamp,
+                scene=scene,
+                meta_by_ts=meta_by_ts,
+                angle_columns=angle_columns,
+                band_selection=band_selection,
+                band_str=band_str,
+                output_dir=output_dir))
+    # surface any exceptions raised in the workers
+    for future in write_futures:
+        future.result()
 
     # to enhance reproducibility and provide proper documentation, the
     # MapperConfigs are saved as yaml (and can be loaded again from yaml)
@@ -19,13 +19,34 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import numpy as np
+import os
 import pandas as pd
+import rasterio
 
-from eodal.core.band import Band
 from eodal.core.raster import RasterCollection
 from pathlib import Path
 from rtm_inv.core.inversion import inv_img, retrieve_traits
 
+from glai_processor._inv_kernel import HAVE_NUMBA, topk_rmse, topk_rmse_numpy
+from glai_processor.utils import validate_cog
+
+# let GDAL use all cores for COG compression and overview building
+# unless the user configured it explicitly
+os.environ.setdefault('GDAL_NUM_THREADS', 'ALL_CPUS')
+
+# gain and offset factors used to quantize the traits to uint16
+# following the GDAL convention `value = DN * scale + offset`: the
+# stored digital number is (trait value - offset) * gain, and the
+# band scale (1/gain) and offset restore physical units. Traits that
+# can be negative (the leaf inclination parameters lidfa/lidfb) get
+# a negative offset so they are not clamped at zero. 65535 marks
+# nodata.
+TRAIT_GAINS = {'lai': 1000., 'cab': 100., 'lidfa': 100., 'lidfb': 100.}
+DEFAULT_TRAIT_GAIN = 1000.
+TRAIT_OFFSETS = {'lidfa': -100., 'lidfb': -100.}
+DEFAULT_TRAIT_OFFSET = 0.
+UINT16_NODATA = 65535
+
 
 def invert(
         fpath_lut: Path,
@@ -35,7 +56,8 @@ def invert(
         band_selection_srf: list[str],
         traits: list[str],
         n_solutions: int = 10,
-        cost_function: str = 'rmse'
+        cost_function: str = 'rmse',
+        use_numba: bool = True
 ) -> None:
     """
     Invert the RTM to get the canopy parameters from the reflectance
@@ -59,18 +81,50 @@ def invert(
         Default: 10.
     :param cost_function:
         cost function to be used for the inversion. Default: 'rmse'.
+    :param use_numba:
+        use the JIT-compiled RMSE kernel if numba is available.
+        Default: True.
     """
     # make sure the two band selections have the same length
     assert len(band_selection_lut) == len(band_selection_srf)
 
-    # read the lookup-table
-    lut = pd.read_pickle(fpath_lut)
-    if not set(band_selection_lut).issubset(lut.columns):
+    # read the lookup-table. Only the spectral bands used in the
+    # inversion and the requested traits are read -- a projection
+    # push-down that pyarrow serves without decoding the remaining
+    # parameter columns.
+    lut_columns = band_selection_lut + [
+        trait for trait in traits if trait not in band_selection_lut]
+    try:
+        lut = pd.read_parquet(
+            fpath_lut, engine='pyarrow', columns=lut_columns)
+    except Exception as e:
         raise KeyError(
-            f'{band_selection_lut} not found in {fpath_lut}')
-
-    # get the satellite spectral data as numpy array
-    srf = RasterCollection.from_multi_band_raster(fpath_srf)
+            f'{lut_columns} not found in {fpath_lut}') from e
+
+    # never request more solutions than the LUT has rows. A short
+    # (NaN-filtered) LUT would otherwise crash the NumPy kernel's
+    # argpartition and make the heap kernel pad its result with
+    # bogus index-0/inf entries that skew the median.
+    n_solutions = min(n_solutions, len(lut))
+
+    # get the satellite spectral data as numpy array. Only the
+    # selected bands are read from the COG -- its internal tiling
+    # makes band-selective reads cheap, so bands not used in the
+    # inversion never leave the disk. The band descriptions map
+    # band names to raster band indices; if the file carries no
+    # descriptions the bands are assumed to be stored in the order
+    # of `band_selection_srf` (as written by `fetch_data`).
+    with rasterio.open(fpath_srf) as src:
+        descriptions = list(src.descriptions)
+    if set(band_selection_srf).issubset(descriptions):
+        band_idxs = [
+            descriptions.index(band) + 1 for band in band_selection_srf]
+    else:
+        band_idxs = list(range(1, len(band_selection_srf) + 1))
+    srf = RasterCollection.from_multi_band_raster(
+        fpath_srf,
+        band_idxs=band_idxs,
+        band_names_dst=band_selection_srf)
     # get GeoInfo of the first selected band for writing the output
     geo_info = srf[band_selection_srf[0]].geo_info
 
@@ -83,15 +137,9 @@ def invert(
         pixel_values_to_ignore=[nodata],  # important to ignore nodata!
         inplace=True)
 
-    # mask nodata pixels. For nodata pixels, the inversion
-    # makes no sense.
-    srf.mask(
-        mask=srf.band_names[0],
-        mask_values=nodata,
-        inplace=True
-    )
-
-    # get reflectance values as numpy ndarray
+    # get reflectance values as numpy ndarray. Nodata pixels are
+    # masked on the ndarray below; going through `srf.mask` first
+    # would rewrite every band a second time for no gain.
     try:
         srf = srf.get_values(
             band_selection=band_selection_srf)
@@ -103,44 +151,103 @@ def invert(
         mask = srf.mask[0, :, :]
         srf = srf.data
     else:
-        mask = np.zeros(shape=(srf.shape[1], srf.shape[2]), dtype='uint8')
-        mask = mask.astype('bool')
+        mask = np.zeros(shape=(srf.shape[1], srf.shape[2]), dtype=bool)
 
     # make sure the mask also captures all nodata pixels
     mask[srf[0, :, :] == nodata] = True
 
-    # get the spectral values from the lookup-table
-    lut_spectra = lut[band_selection_lut].values
-
-    # invert the RTM
-    lut_idxs, cost_function_values = inv_img(
-        lut=lut_spectra,
-        img=srf,
-        mask=mask,
-        cost_function=cost_function,
-        n_solutions=n_solutions,
-    )
-    # debug: nodata handling makes no sense
-    trait_img = retrieve_traits(
-        lut=lut,
-        lut_idxs=lut_idxs,
-        traits=traits,
-        cost_function_values=cost_function_values,
-        measure='median'
-    )
-    trait_img = trait_img[0]
-
-    # save traits to file
-    trait_collection = RasterCollection()
-    for tdx, trait in enumerate(traits):
-        # TODO: We should also scale the traits to UINT16 to save
-        # disk space
-        trait_collection.add_band(
-            Band,
-            geo_info=geo_info,
-            band_name=trait,
-            values=trait_img[tdx, :, :],
-            nodata=0
+    # cast the reflectances to a contiguous float32 cube once.
+    # Reflectance precision is ~1e-4, so float32 loses nothing but
+    # halves the bytes every downstream kernel moves through cache.
+    srf = np.ascontiguousarray(srf, dtype=np.float32)
+
+    # get the spectral values from the lookup-table as a contiguous
+    # float32 matrix. Reflectance precision is ~1e-4, so float32 is
+    # sufficient and halves the LUT bytes moved through the caches.
+    lut_spectra = np.ascontiguousarray(
+        lut[band_selection_lut].values, dtype=np.float32)
+
+    if mask.all():
+        # fully masked scene (e.g., completely cloudy): every output
+        # pixel is nodata anyway, so skip the inversion entirely and
+        # only write the nodata raster below
+        trait_img = np.zeros(
+            (len(traits), *mask.shape), dtype=np.float32)
+    elif cost_function == 'rmse':
+        # top-k RMSE search over the valid pixels only. The pixels
+        # are compacted into a contiguous (n_valid, n_bands) matrix
+        # so the kernels iterate branch-free over dense data instead
+        # of testing the mask per pixel.
+        valid = ~mask
+        pixels = np.ascontiguousarray(
+            srf.transpose(1, 2, 0)[valid], dtype=np.float32)
+        if use_numba and HAVE_NUMBA:
+            lut_idxs, _ = topk_rmse(pixels, lut_spectra, n_solutions)
+        else:
+            lut_idxs, _ = topk_rmse_numpy(
+                pixels, lut_spectra, n_solutions)
+        # aggregate the n_solutions best LUT entries per pixel into
+        # a single solution using the median
+        lut_traits = lut[traits].to_numpy(np.float32)
+        trait_flat = np.median(lut_traits[lut_idxs], axis=1)
+        trait_img = np.zeros(
+            (len(traits), *mask.shape), dtype=trait_flat.dtype)
+        trait_img[:, valid] = trait_flat.T
+    else:
+        # invert the RTM
+        lut_idxs, cost_function_values = inv_img(
+            lut=lut_spectra,
+            img=srf,
+            mask=mask,
+            cost_function=cost_function,
+            n_solutions=n_solutions,
+        )
+        # debug: nodata handling makes no sense
+        trait_img = retrieve_traits(
+            lut=lut,
+            lut_idxs=lut_idxs,
+            traits=traits,
+            cost_function_values=cost_function_values,
+            measure='median'
         )
+        trait_img = trait_img[0]
+
+    # save traits to file. The traits are quantized to uint16 which
+    # halves (float32) or quarters (float64) disk space and read
+    # bandwidth; the gain needed to restore physical units is stored
+    # in the band's scale attribute.
+    quantized = np.empty(
+        (len(traits), *mask.shape), dtype=np.uint16)
+    scales = []
+    offsets = []
+    for tdx, trait in enumerate(traits):
+        gain = TRAIT_GAINS.get(trait, DEFAULT_TRAIT_GAIN)
+        offset = TRAIT_OFFSETS.get(trait, DEFAULT_TRAIT_OFFSET)
+        values = np.clip(
+            (trait_img[tdx, :, :] - offset) * gain, 0, UINT16_NODATA - 1
+        ).astype(np.uint16)
+        values[mask] = UINT16_NODATA
+        quantized[tdx] = values
+        scales.append(1. / gain)
+        offsets.append(offset)
+    # write all trait bands with a single rasterio call. Building a
+    # RasterCollection band by band would copy every trait once more
+    # and re-tile the stack on the final COG conversion.
     fpath_traits = output_dir / fpath_srf.name.replace('.tiff', '_traits.tiff')
-    trait_collection.to_rasterio(fpath_traits, as_cog=True)
+    with rasterio.open(
+            fpath_traits, 'w',
+            driver='COG',
+            height=quantized.shape[1],
+            width=quantized.shape[2],
+            count=len(traits),
+            dtype='uint16',
+            crs=f'EPSG:{geo_info.epsg}',
+            transform=geo_info.as_affine(),
+            nodata=UINT16_NODATA,
+            compress='deflate') as dst:
+        dst.write(quantized)
+        dst.descriptions = tuple(traits)
+        dst.scales = scales
+        dst.offsets = offsets
+    # warn early if the written file has a broken COG layout
+    validate_cog(fpath_traits)
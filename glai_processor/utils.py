@@ -18,12 +18,54 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-from datetime import datetime, timedelta
+import yaml
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
+# prefer the libyaml-backed loader; it is roughly an order of
+# magnitude faster than the pure-Python fallback and load_angles
+# runs once per scene
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 
 PLATFORMS = {'S2A': 'Sentinel2A', 'S2B': 'Sentinel2B'}
 
+# default acquisition angles and the mapping from the names used in
+# the angle YAML files to the names expected by the RTM. Module-level
+# so get_required_angles builds its result in a single dict merge.
+_ANGLE_DEFAULTS = {
+    'solar_zenith_angle': 45,
+    'solar_azimuth_angle': 180,
+    'viewing_zenith_angle': 0,
+    'viewing_azimuth_angle': 180
+}
+_ANGLE_RENAME = {
+    'sun_zenith_angle': 'solar_zenith_angle',
+    'sun_azimuth_angle': 'solar_azimuth_angle',
+    'sensor_zenith_angle': 'viewing_zenith_angle',
+    'sensor_azimuth_angle': 'viewing_azimuth_angle'
+}
+
+
+def platform_from_filename(name: str) -> str:
+    """
+    Resolve the platform (e.g., 'Sentinel2A') from a scene file
+    name whose first underscore-separated component is the platform
+    abbreviation. `partition` extracts the prefix without
+    allocating a list for the remaining components.
+
+    :param name:
+        scene file name (e.g., 'S2A_2022-06-13_angles.yaml')
+    :return:
+        full platform name
+    """
+    return PLATFORMS[name.partition('_')[0]]
+
 
 def get_latest_scene(output_dir: Path, start_time: datetime) -> datetime:
     """
@@ -38,10 +80,11 @@ def get_latest_scene(output_dir: Path, start_time: datetime) -> datetime:
     """
     fpath_latest_scene = output_dir.joinpath('latest_scene')
     if fpath_latest_scene.exists():
-        with open(output_dir.joinpath('latest_scene'), 'r') as f:
-            timestamp_raw = f.read()
-        timestamp_raw = timestamp_raw.replace('\n', '')
-        timestamp = datetime.strptime(timestamp_raw, '%Y-%m-%d')
+        timestamp_raw = fpath_latest_scene.read_text().strip()
+        # the file stores a plain ISO date; date.fromisoformat is
+        # C-implemented and considerably faster than strptime
+        timestamp = datetime.combine(
+            date.fromisoformat(timestamp_raw), datetime.min.time())
     else:
         timestamp = start_time - timedelta(days=1)
     return timestamp
@@ -59,16 +102,41 @@ def get_required_angles(
     :return:
         dictionary containing the angles
     """
-    required_angles = {}
-    required_angles['solar_zenith_angle'] = \
-        angles.get('sun_zenith_angle', 45)
-    required_angles['solar_azimuth_angle'] = \
-        angles.get('sun_azimuth_angle', 180)
-    required_angles['viewing_zenith_angle'] = \
-        angles.get('sensor_zenith_angle', 0)
-    required_angles['viewing_azimuth_angle'] = \
-        angles.get('sensor_azimuth_angle', 180)
-    return required_angles
+    return {
+        **_ANGLE_DEFAULTS,
+        **{_ANGLE_RENAME[k]: v for k, v in angles.items()
+           if k in _ANGLE_RENAME}
+    }
+
+
+def validate_cog(fpath: Path) -> bool:
+    """
+    Validate that a written raster is a proper cloud-optimized
+    GeoTiff. A mis-ordered or overview-less file silently degrades
+    read performance for all downstream consumers, so problems are
+    logged as warnings right at the source. Validation itself never
+    raises.
+
+    :param fpath:
+        path to the raster file to validate
+    :return:
+        True if the file is a valid cloud-optimized GeoTiff
+    """
+    from eodal.config import get_settings
+    from rio_cogeo.cogeo import cog_validate
+
+    logger = get_settings().logger
+    try:
+        is_valid, errors, warnings = cog_validate(str(fpath), quiet=True)
+    except Exception as e:
+        logger.warning('Could not validate COG %s: %s', fpath, e)
+        return False
+    for message in errors + warnings:
+        logger.warning('COG validation of %s: %s', fpath.name, message)
+    if not is_valid:
+        logger.warning(
+            '%s is not a valid cloud-optimized GeoTiff', fpath)
+    return is_valid
 
 
 def indicate_complete(output_dir_scene: Path) -> None:
@@ -80,11 +148,32 @@ def indicate_complete(output_dir_scene: Path) -> None:
     :param output_dir_scene:
         output directory of the scene.
     """
-    fpath_complete = output_dir_scene.joinpath(
-        'complete.txt'
-    )
-    with open(fpath_complete, 'w') as f:
-        f.write('complete')
+    output_dir_scene.joinpath('complete.txt').write_text('complete')
+
+
+@lru_cache(maxsize=128)
+def _load_angles_cached(
+        fpath_str: str,
+        mtime_ns: int
+) -> dict[str, float]:
+    """
+    Read and parse an angle YAML file. Memoized by path and
+    modification time, so re-reading an unchanged file is free;
+    `mtime_ns` is part of the key solely to invalidate stale
+    entries when a file is rewritten.
+
+    :param fpath_str:
+        path to the YAML file containing the angles
+    :param mtime_ns:
+        modification time of the file in nanoseconds
+    :return:
+        dictionary containing the angles
+    """
+    with open(fpath_str, 'r') as src:
+        angles = yaml.load(src, Loader=_YamlLoader)
+
+    # make sure all required angles are present
+    return get_required_angles(angles)
 
 
 def load_angles(
@@ -92,23 +181,25 @@ def load_angles(
 ) -> dict[str, float]:
     """
     Load the viewing and illumination angles from a YAML file.
+    Repeated loads of an unchanged file are served from an
+    in-process cache.
 
     :param fpath_angles:
         path to the YAML file containing the angles
     :return:
         dictionary containing the angles
     """
-    import yaml
-    with open(fpath_angles, 'r') as src:
-        angles = yaml.safe_load(src)
-
-    # make sure all required angles are present
-    return get_required_angles(angles)
+    mtime_ns = Path(fpath_angles).stat().st_mtime_ns
+    # hand out a copy so callers may mutate the result without
+    # corrupting the cache
+    return dict(_load_angles_cached(str(fpath_angles), mtime_ns))
 
 
 def set_latest_scene(
         output_dir: Path,
-        timestamp: datetime
+        timestamp: datetime,
+        *,
+        now: datetime | None = None
 ) -> None:
     """
     Set the timestamp of the latest scene
@@ -118,12 +209,17 @@ def set_latest_scene(
         directory where scenes are stored (in sub-directories)
     :param timestamp:
         time stamp of the latest scene
+    :param now:
+        wall-clock snapshot used to clamp future timestamps.
+        Defaults to `datetime.now()`; callers running in a loop can
+        pass their own snapshot to avoid re-reading the clock.
     """
-    # make sure the latest scene is never in the future
-    if timestamp > datetime.now():
-        timestamp = datetime.now()
+    # make sure the latest scene is never in the future. The clock
+    # is read (at most) once so both uses see the same instant.
+    if now is None:
+        now = datetime.now()
+    if timestamp > now:
+        timestamp = now
     # create output directory if it does not exist
-    if not output_dir.exists():
-        output_dir.mkdir(parents=True)
-    with open(output_dir.joinpath('latest_scene'), 'w+') as f:
-        f.write(f'{timestamp.date()}')
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_dir.joinpath('latest_scene').write_text(f'{timestamp.date()}')
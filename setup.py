@@ -7,13 +7,19 @@ setup(
     author='Lukas Valentin Graf',
     author_email='lukas.graf@terensis.io',
     packages=find_packages(),
+    # optional vendored auxiliary files (spectral response functions,
+    # RTM parametrizations); used instead of the remote URLs if present
+    package_data={'glai_processor': ['data/*.xlsx', 'data/*.csv']},
+    include_package_data=True,
     entry_points={
         'console_scripts': [
             'glai_processor = glai_processor.cli:main'
         ]
     },
     install_requires=[
+        'pyarrow',
         'rio-cogeo',
+        'urllib3',
         'eodal',
         'rtm_inv @ git+https://github.com/EOA-team/rtm_inv',
     ],
@@ -25,7 +25,7 @@ from glai_processor.constants import (
 from glai_processor.inversion import invert
 from glai_processor.utils import (
     load_angles,
-    PLATFORMS
+    platform_from_filename
 )
 
 settings = get_settings()
@@ -162,7 +162,7 @@ def test_run_rtm_forward():
     # GeoTiff file containing the spectral values
     fpath_srf = Path('data/S2A_2022-06-13_B02-B03-B04-B08-SCL.tiff')
     # get the platform from the file name
-    platform = PLATFORMS[fpath_srf.name.split('_')[0]]
+    platform = platform_from_filename(fpath_srf.name)
 
     # generate the lookup-tables using the methodology from
     # Graf et al. (2023, RSE, https://doi.org/10.1016/j.rse.2023.113860)
@@ -183,8 +183,12 @@ def test_run_rtm_forward():
     # save the lookup-tables
     lut_srf.dropna(inplace=True)
     assert not lut_srf.empty
-    fpath_lut = Path('data/S2A_2022-06-13_lut.pkl')
-    lut_srf.to_pickle(fpath_lut)
+    fpath_lut = Path('data/S2A_2022-06-13_lut.parquet')
+    lut_srf.to_parquet(
+        fpath_lut,
+        engine='pyarrow',
+        compression='zstd',
+        compression_level=1)
     assert fpath_lut.exists()
 
 
@@ -193,7 +197,7 @@ def test_inversion():
     Test the inversion of the RTM.
     """
     # define the lookup-table
-    fpath_lut = Path('data/S2A_2022-06-13_lut.pkl')
+    fpath_lut = Path('data/S2A_2022-06-13_lut.parquet')
     # define the GeoTiff file containing the spectral values
     fpath_srf = Path('data/S2A_2022-06-13_blue-green-red-nir_1.tiff')
     # define the output directory
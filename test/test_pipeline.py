@@ -2,6 +2,7 @@
 Test of the entire GLAI processor (integration test).
 """
 
+import os
 import pytest
 import glai_processor.cli as cli
 import shutil
@@ -15,9 +16,15 @@ from unittest.mock import Mock
 from glai_processor import monitor_folder
 
 
-@pytest.fixture
+def _count_suffix(folder: Path, suffix: str) -> int:
+    """count the files in `folder` whose name ends with `suffix`"""
+    with os.scandir(folder) as entries:
+        return sum(1 for e in entries if e.name.endswith(suffix))
+
+
+@pytest.fixture(scope='module')
 def generate_test_feature() -> Feature:
-    """get a test feature"""
+    """get a test feature (immutable, hence built once per module)"""
     minx = 1252439
     miny = 6104370
     maxx = 1255556
@@ -73,12 +80,9 @@ def test_s2_pipeline(generate_test_feature):
 
     # make sure all outputs have been generated
     assert folder_to_monitor.joinpath('latest_scene').exists()
-    lut_files = [x for x in folder_to_monitor.glob('*.pkl')]
-    tiff_files = [x for x in folder_to_monitor.glob('*.tiff')]
-    angle_files = [x for x in folder_to_monitor.glob('*angles.yaml')]
-    assert len(lut_files) == 4
-    assert len(tiff_files) == 8
-    assert len(angle_files) == 4
+    assert _count_suffix(folder_to_monitor, '.parquet') == 4
+    assert _count_suffix(folder_to_monitor, '.tiff') == 8
+    assert _count_suffix(folder_to_monitor, 'angles.yaml') == 4
 
     # clean up for subsequent tests
     shutil.rmtree(folder_to_monitor)